@@ -2,7 +2,6 @@
 # dependencies = [
 #   "typer",
 #   "questionary",
-#   "chardet",
 #   "rich",
 # ]
 # ///
@@ -10,35 +9,70 @@
 import subprocess
 import sys
 import os
+import fnmatch
+import locale
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import typer
 import questionary
-import chardet
 from rich.console import Console
 from rich.progress import track
 
 console = Console()
 app = typer.Typer(add_completion=False)
 
+# Upper bound on concurrent per-repo git workers
+MAX_WORKERS = 32
+# Above this many repos, interactive selection asks for exclude globs instead of
+# rendering a checkbox per repo
+CHECKBOX_MAX_REPOS = 200
+# Above this many repos, progress is reported with a plain counter instead of a rich progress bar
+PROGRESS_BAR_MAX_REPOS = 500
+# fd name regex matching exactly ".git"
+FD_GIT_PATTERN = r"^\.git$"
+# Read size for streaming fd output
+FD_READ_SIZE = 64 * 1024
+
+# Environment for git subprocesses, built once. Skip optional lock files (e.g. the
+# index refresh lock) and fail instead of blocking a worker on a credential prompt.
+GIT_ENV_EXTRA = {
+    "GIT_OPTIONAL_LOCKS": "0",
+    "GIT_TERMINAL_PROMPT": "0",
+}
+GIT_ENV = {**os.environ, **GIT_ENV_EXTRA}
+
+# Fallback for output that isn't valid UTF-8 (e.g. localized git messages on Windows)
+LOCALE_ENCODING = locale.getpreferredencoding(False)
+
+_PATH_SEPARATORS = os.sep + (os.altsep or "")
+
 def detect_decode(data: bytes) -> str:
     """
-    Detects the encoding of the byte data and decodes it to a string.
-    Falls back to utf-8 (replace) if detection fails.
+    Decodes subprocess output to a string.
+    Tries ASCII/UTF-8 first, then the locale's preferred encoding
+    (e.g. cp949 on a Korean Windows console), replacing undecodable bytes.
     """
     if not data:
         return ""
-    result = chardet.detect(data)
-    encoding = result['encoding'] or 'utf-8'
+    # Git output is almost always ASCII/UTF-8
+    if data.isascii():
+        return data.decode('ascii')
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
     try:
-        return data.decode(encoding)
-    except Exception:
+        return data.decode(LOCALE_ENCODING, errors='replace')
+    except LookupError:
         return data.decode('utf-8', errors='replace')
 
-def run_command(cmd: List[str], cwd: Optional[Path] = None, capture: bool = True) -> Tuple[int, str, str]:
+def run_command(cmd: List[str], cwd: Optional[Path] = None, capture: bool = True, env: Optional[Dict[str, str]] = None) -> Tuple[int, str, str]:
     """
     Runs a command and returns (returncode, stdout, stderr).
-    Handles encoding detection for output.
+    Handles encoding detection for output. env replaces the inherited environment when given.
     """
     try:
         # On Windows, we might need shell=True for some commands, but usually not for list-based args.
@@ -47,6 +81,7 @@ def run_command(cmd: List[str], cwd: Optional[Path] = None, capture: bool = True
             cmd,
             cwd=cwd,
             capture_output=capture,
+            env=env,
             check=False
         )
         stdout = detect_decode(result.stdout)
@@ -57,45 +92,156 @@ def run_command(cmd: List[str], cwd: Optional[Path] = None, capture: bool = True
     except Exception as e:
         return 1, "", str(e)
 
-def find_git_repos(root_path: Path) -> List[Path]:
+def _git_entry_parent(entry: bytes) -> str:
+    """
+    Returns the repository directory for a raw .git path printed by fd.
     """
-    Finds git repositories using 'fd' or falls back to os.walk.
+    # Newer fd versions print directories with a trailing separator
+    return os.path.dirname(os.fsdecode(entry).rstrip(_PATH_SEPARATORS))
+
+def _run_fd_streaming(cmd: List[str], cwd: Optional[Path] = None) -> Tuple[int, List[Path], str]:
+    """
+    Runs an fd command that lists .git entries (with -0) and returns (returncode, repos, stderr).
+    Parses stdout as it arrives instead of buffering the whole output.
     """
-    # Check if fd is installed
-    code, _, _ = run_command(["fd", "--version"])
+    # Dedup on the raw strings as they stream in, and only build Path objects at the end
+    repos = set()
+    try:
+        # stderr goes to a temp file so a chatty fd (e.g. permission errors) can't block on a full pipe
+        with tempfile.TemporaryFile() as err_file:
+            with subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=err_file, bufsize=-1) as proc:
+                # fd runs with -0, so entries are NUL-separated raw bytes; a path may contain newlines.
+                pending = b""
+                for chunk in iter(lambda: proc.stdout.read1(FD_READ_SIZE), b""):
+                    *entries, pending = (pending + chunk).split(b"\0")
+                    for entry in entries:
+                        if entry:
+                            repos.add(_git_entry_parent(entry))
+                if pending:
+                    repos.add(_git_entry_parent(pending))
+            err_file.seek(0)
+            stderr = detect_decode(err_file.read())
+        return proc.returncode, [Path(r) for r in repos], stderr
+    except FileNotFoundError:
+        return 127, [], f"Command not found: {cmd[0]}"
+    except Exception as e:
+        return 1, [], str(e)
 
+def _scan(root_path: Path) -> List[Path]:
+    """
+    Walks root_path with os.scandir and returns directories containing a .git entry.
+    """
     repos = []
+    # Explicit stack over os.scandir: DirEntry carries the d_type from readdir,
+    # so classifying entries needs no extra stat call per entry (unlike os.walk).
+    # The walk runs on bytes paths so entry names are never decoded; only hits are.
+    stack = [os.fsencode(root_path)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.name == b".git":
+                        # .git is a directory, or a file for worktrees/submodules.
+                        # Record the repo but don't recurse into .git itself.
+                        if entry.is_dir(follow_symlinks=False) or entry.is_file(follow_symlinks=False):
+                            repos.append(Path(os.fsdecode(current)))
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except OSError:
+            # Unreadable or vanished directory; skip it like os.walk does
+            continue
+
+    return repos
+
+def _git(args: List[str], repo: Path) -> Tuple[int, str, str]:
+    """
+    Runs a git command against repo and returns (returncode, stdout, stderr).
+    Uses 'git -C <repo>' so the repo is part of the argv rather than the child's cwd.
+    """
+    return run_command(["git", "-C", str(repo), *args], env=GIT_ENV)
+
+def find_git_repos(root_path: Path) -> List[Path]:
+    """
+    Finds git repositories using 'fd' or falls back to an os.scandir walk.
+    """
+    # Check if fd is installed (PATH lookup only, no subprocess)
+    fd_path = shutil.which("fd")
 
-    if code == 0:
+    if fd_path is not None:
         console.print(f"[green]Scanning {root_path} using fd...[/green]")
-        # fd -H (hidden) -I (no-ignore) -t d (type directory) "^.git$" (name regex) <root_path>
-        # We look for the .git folder itself to be sure.
-        cmd = ["fd", "-H", "-I", "-t", "d", "^.git$", str(root_path)]
-        code, stdout, stderr = run_command(cmd)
+        # fd -H (hidden) -I (no-ignore) -0 (NUL-separated output) "^\.git$" (name regex) <root_path>
+        # We look for the .git entry itself: a folder, or a file for worktrees/submodules.
+        # The dot is escaped so only the exact name ".git" matches (not "_git", "xgit", ...),
+        # same as the scandir fallback.
+        # Use the resolved fd path so subprocess doesn't search PATH again.
+        cmd = [fd_path, "-H", "-I", "-0", FD_GIT_PATTERN, str(root_path)]
+        code, repos, stderr = _run_fd_streaming(cmd)
 
         if code != 0:
             console.print(f"[red]fd execution failed:[/red] {stderr}")
             console.print("[yellow]Falling back to standard scan...[/yellow]")
         else:
-            lines = stdout.strip().splitlines()
-            for line in lines:
-                git_dir = Path(line.strip())
-                repos.append(git_dir.parent)
             return repos
+    else:
+        console.print("[yellow]fd not found. Using standard os.scandir walk (this might be slower)...[/yellow]")
+
+    return _scan(root_path)
+
+def filter_excluded(repos: List[Path], patterns: str) -> List[Path]:
+    """
+    Drops repos whose path matches any of the comma-separated glob patterns.
+    """
+    globs = [p.strip() for p in patterns.split(",") if p.strip()]
+    if not globs:
+        return repos
+    return [r for r in repos if not any(fnmatch.fnmatchcase(str(r), g) for g in globs)]
+
+def process_repo(repo: Path, find: str, replace: str) -> Tuple[str, List[str]]:
+    """
+    Updates the origin URL of a single repository and fetches from it.
+    Returns (status, messages) where status is "success", "failed" or "skipped"
+    and messages are the lines to print for this repo.
+    """
+    messages = [f"\n[bold blue]repo:[/bold blue] {repo}"]
 
+    # Get current URL
+    code, stdout, stderr = _git(["remote", "get-url", "origin"], repo)
     if code != 0:
-        console.print("[yellow]fd not found or failed. Using standard os.walk (this might be slower)...[/yellow]")
+        messages.append(f"  [red]Failed to get origin:[/red] {stderr.strip()}")
+        return "failed", messages
 
-    for dirpath, dirnames, filenames in os.walk(root_path):
-        if ".git" in dirnames:
-            repos.append(Path(dirpath))
-            # Don't recurse into .git
-            # Also, usually we don't need to look inside a git repo for other git repos (submodules are handled differently)
-            # But let's just avoid entering .git
-            if ".git" in dirnames:
-                dirnames.remove(".git")
+    current_url = stdout.strip()
+    messages.append(f"  Current Origin: {current_url}")
 
-    return repos
+    if find not in current_url:
+        messages.append(f"  [yellow]Skipping:[/yellow] '{find}' not found in URL.")
+        return "skipped", messages
+
+    new_url = current_url.replace(find, replace)
+    messages.append(f"  New Origin:     {new_url}")
+
+    if new_url == current_url:
+        messages.append(f"  [yellow]Skipping:[/yellow] URL unchanged.")
+        return "skipped", messages
+
+    # Set URL
+    code, stdout, stderr = _git(["remote", "set-url", "origin", new_url], repo)
+    if code != 0:
+        messages.append(f"  [red]Failed to set origin:[/red] {stderr.strip()}")
+        return "failed", messages
+
+    # Fetch
+    messages.append("  Fetching...")
+    code, stdout, stderr = _git(["fetch", "origin"], repo)
+    if code != 0:
+        messages.append(f"  [red]Fetch failed:[/red] {stderr.strip()}")
+        messages.append("  [red]The origin was changed, but fetch failed. Please check the URL.[/red]")
+        return "failed", messages
+
+    messages.append("  [green]Success![/green]")
+    return "success", messages
 
 @app.command()
 def main(
@@ -103,6 +249,8 @@ def main(
     find: str = typer.Option(None, help="String to find in the origin URL"),
     replace: str = typer.Option(None, help="String to replace with"),
     batch: bool = typer.Option(False, "--batch", "-b", help="Run in batch mode without interactive confirmation"),
+    exclude: str = typer.Option(None, help="Comma-separated glob patterns of repository paths to exclude"),
+    resolve_symlinks: bool = typer.Option(False, "--resolve-symlinks", help="Resolve symlinks in repository paths (slower on large or network filesystems)"),
 ):
     """
     Scans for git repositories in the given PATH and updates their origin URL.
@@ -117,33 +265,52 @@ def main(
         console.print("[yellow]No git repositories found.[/yellow]")
         raise typer.Exit()
 
-    # Normalize paths for cleaner display
-    try:
-        display_repos = [r.resolve() for r in repos]
-    except Exception:
-        display_repos = repos
+    # Normalize paths for cleaner display. abspath is pure string work;
+    # resolve() stats every path component, so only do it when asked.
+    # find_git_repos already dedups; resolving can still merge symlinked duplicates.
+    if resolve_symlinks:
+        try:
+            display_repos = sorted({r.resolve() for r in repos})
+        except Exception:
+            display_repos = sorted(Path(os.path.abspath(r)) for r in repos)
+    else:
+        display_repos = sorted(Path(os.path.abspath(r)) for r in repos)
 
     console.print(f"Found {len(display_repos)} repositories.")
 
     # Select repos
     selected_repos = display_repos
+    if exclude:
+        selected_repos = filter_excluded(selected_repos, exclude)
     if not batch:
-        # Ask user to exclude
-        choices = [
-            questionary.Choice(str(r), checked=True)
-            for r in display_repos
-        ]
-
-        selected_strings = questionary.checkbox(
-            "Select repositories to process (uncheck to exclude):",
-            choices=choices
-        ).ask()
-
-        if selected_strings is None: # Cancelled
-            console.print("Operation cancelled.")
-            raise typer.Exit()
-
-        selected_repos = [Path(s) for s in selected_strings]
+        # Decide on the found count so a large tree never renders the checkbox,
+        # even if --exclude already narrowed it down
+        if len(display_repos) <= CHECKBOX_MAX_REPOS:
+            # Ask user to exclude
+            choices = [
+                questionary.Choice(str(r), checked=True)
+                for r in selected_repos
+            ]
+
+            selected_strings = questionary.checkbox(
+                "Select repositories to process (uncheck to exclude):",
+                choices=choices
+            ).ask()
+
+            if selected_strings is None: # Cancelled
+                console.print("Operation cancelled.")
+                raise typer.Exit()
+
+            selected_repos = [Path(s) for s in selected_strings]
+        elif exclude is None:
+            # Too many repos to render as a checkbox list; ask for exclude globs instead
+            patterns = questionary.text("Exclude patterns (glob, comma-separated, empty=none):").ask()
+
+            if patterns is None: # Cancelled
+                console.print("Operation cancelled.")
+                raise typer.Exit()
+
+            selected_repos = filter_excluded(selected_repos, patterns)
 
     if not selected_repos:
         console.print("No repositories selected.")
@@ -175,53 +342,58 @@ def main(
     fail_count = 0
     skip_count = 0
 
-    # Using track for progress bar
-    # We iterate over selected_repos
-
-    # We explicitly convert generator to list for track if needed, but it's already a list.
-    for repo in track(selected_repos, description="Processing repositories..."):
-        console.print(f"\n[bold blue]repo:[/bold blue] {repo}")
-
-        # Get current URL
-        code, stdout, stderr = run_command(["git", "remote", "get-url", "origin"], cwd=repo)
-        if code != 0:
-            console.print(f"  [red]Failed to get origin:[/red] {stderr.strip()}")
-            fail_count += 1
-            continue
-
-        current_url = stdout.strip()
-        console.print(f"  Current Origin: {current_url}")
-
-        if find not in current_url:
-            console.print(f"  [yellow]Skipping:[/yellow] '{find}' not found in URL.")
+    # Repos are independent and the git calls are dominated by process/network latency,
+    # so run them in a thread pool (subprocess.run releases the GIL while waiting).
+    # Each worker buffers its output and the main thread prints it as repos complete,
+    # which keeps every repo's lines together.
+    max_workers = min(MAX_WORKERS, len(selected_repos))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = [executor.submit(process_repo, repo, find, replace) for repo in selected_repos]
+    total = len(futures)
+    reported = set()
+
+    def report(future) -> None:
+        nonlocal success_count, fail_count, skip_count
+        reported.add(future)
+        status, messages = future.result()
+        for message in messages:
+            console.print(message)
+
+        if status == "success":
+            success_count += 1
+        elif status == "skipped":
             skip_count += 1
-            continue
-
-        new_url = current_url.replace(find, replace)
-        console.print(f"  New Origin:     {new_url}")
-
-        if new_url == current_url:
-             console.print(f"  [yellow]Skipping:[/yellow] URL unchanged.")
-             skip_count += 1
-             continue
-
-        # Set URL
-        code, stdout, stderr = run_command(["git", "remote", "set-url", "origin", new_url], cwd=repo)
-        if code != 0:
-            console.print(f"  [red]Failed to set origin:[/red] {stderr.strip()}")
+        else:
             fail_count += 1
-            continue
 
-        # Fetch
-        console.print("  Fetching...")
-        code, stdout, stderr = run_command(["git", "fetch", "origin"], cwd=repo)
-        if code != 0:
-            console.print(f"  [red]Fetch failed:[/red] {stderr.strip()}")
-            console.print("  [red]The origin was changed, but fetch failed. Please check the URL.[/red]")
-            fail_count += 1
-        else:
-            console.print("  [green]Success![/green]")
-            success_count += 1
+    # The rich progress bar repaints on every tick; for batch runs and large repo
+    # counts print a plain [i/N] counter about every 1% instead.
+    use_counter = batch or total > PROGRESS_BAR_MAX_REPOS
+    step = max(1, total // 100)
+    completed = as_completed(futures)
+    if not use_counter:
+        completed = track(completed, total=total, description="Processing repositories...")
+
+    try:
+        for i, future in enumerate(completed, start=1):
+            report(future)
+            if use_counter and (i % step == 0 or i == total):
+                console.print(f"[{i}/{total}]", markup=False)
+    except KeyboardInterrupt:
+        # Don't touch any more remotes after the user cancels: drop queued repos and
+        # only let the ones already running finish, then report those too.
+        executor.shutdown(wait=True, cancel_futures=True)
+        for future in futures:
+            if future not in reported and future.done() and not future.cancelled():
+                report(future)
+        console.print(
+            f"\n[red]Interrupted.[/red] Processed {len(reported)} of {total} repositories; "
+            f"the remaining {total - len(reported)} were not changed."
+        )
+        console.print(f"Success: {success_count}, Failed: {fail_count}, Skipped: {skip_count}")
+        raise typer.Exit(code=1)
+    finally:
+        executor.shutdown(wait=True)
 
     console.print(f"\n[bold]Done.[/bold] Success: {success_count}, Failed: {fail_count}, Skipped: {skip_count}")
 
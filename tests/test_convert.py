@@ -1,6 +1,9 @@
 
 import sys
 import os
+import re
+import time
+from concurrent.futures import as_completed
 from pathlib import Path
 from unittest import mock
 import pytest
@@ -15,20 +18,16 @@ runner = CliRunner()
 
 @pytest.fixture
 def mock_fd_success():
-    with mock.patch("convert.run_command") as m:
-        # First call checks version (success)
-        # Second call runs fd (success, returns some paths)
-        m.side_effect = [
-            (0, "fd 8.0.0", ""), # version
-            (0, "/path/to/repo1/.git\n/path/to/repo2/.git\n", "") # fd result
-        ]
+    with mock.patch("convert.shutil.which", return_value="/usr/bin/fd"), \
+         mock.patch("convert._run_fd_streaming") as m:
+        # fd is found on PATH, so the only call runs fd (success, returns some paths)
+        m.return_value = (0, [Path("/path/to/repo1"), Path("/path/to/repo2")], "")
         yield m
 
 @pytest.fixture
 def mock_fd_not_found():
-    with mock.patch("convert.run_command") as m:
-        # First call checks version (fails)
-        m.side_effect = [(127, "", "command not found")]
+    with mock.patch("convert.shutil.which", return_value=None), \
+         mock.patch("convert._run_fd_streaming") as m:
         yield m
 
 def test_detect_decode():
@@ -36,30 +35,74 @@ def test_detect_decode():
     assert convert.detect_decode(None) == ""
     # Test utf-8
     assert convert.detect_decode("한글".encode("utf-8")) == "한글"
-    # Test fallback (mock chardet failure or strange bytes)
-    # Using invalid utf-8 sequence
-    bad_bytes = b'\xff\xfe\x00' # might be utf-16 BOM but partial?
-    # chardet should detect it or we fallback.
+    # Test fallback: invalid utf-8 still decodes to a string
+    bad_bytes = b'\xff\xfe\x00'
     decoded = convert.detect_decode(bad_bytes)
     assert isinstance(decoded, str)
 
+def test_detect_decode_locale_fallback():
+    # Non-UTF-8 output (e.g. a Korean Windows console) decodes with the locale encoding
+    with mock.patch("convert.LOCALE_ENCODING", "cp949"):
+        assert convert.detect_decode("한글".encode("cp949")) == "한글"
+    with mock.patch("convert.LOCALE_ENCODING", "not-a-codec"):
+        assert convert.detect_decode(b"\xff") == "\ufffd"
+
 def test_find_git_repos_fd_success(mock_fd_success):
     repos = convert.find_git_repos(Path("/root"))
     assert len(repos) == 2
     assert Path("/path/to/repo1") in repos
     assert Path("/path/to/repo2") in repos
+    # fd is invoked via the path found by shutil.which
+    assert mock_fd_success.call_args[0][0][0] == "/usr/bin/fd"
+
+def test_fd_pattern_matches_only_exact_git_name():
+    # fd matches the regex against file names; only ".git" itself may match
+    pattern = re.compile(convert.FD_GIT_PATTERN)
+    assert pattern.search(".git")
+    for name in ["_git", "xgit", ".gitignore", ".git.bak", "a.git"]:
+        assert not pattern.search(name)
+
+def test_find_git_repos_passes_exact_pattern_to_fd(mock_fd_success):
+    convert.find_git_repos(Path("/root"))
+    cmd = mock_fd_success.call_args[0][0]
+    assert "-0" in cmd
+    assert convert.FD_GIT_PATTERN in cmd
+
+def test_find_git_repos_fallback(mock_fd_not_found, tmp_path):
+    # Fallback walks the real filesystem with os.scandir
+    (tmp_path / "repo3" / ".git").mkdir(parents=True)
+    (tmp_path / "repo3" / "src").mkdir()
+    (tmp_path / "repo4" / "src").mkdir(parents=True)
+    (tmp_path / "repo4" / "README.md").write_text("readme")
+    # Worktrees/submodules use a .git file instead of a directory
+    (tmp_path / "repo5").mkdir()
+    (tmp_path / "repo5" / ".git").write_text("gitdir: ../elsewhere")
+
+    repos = convert.find_git_repos(tmp_path)
+    # Should find repo3 and repo5, but not repo4
+    assert len(repos) == 2
+    assert tmp_path / "repo3" in repos
+    assert tmp_path / "repo5" in repos
+    mock_fd_not_found.assert_not_called()
 
-def test_find_git_repos_fallback(mock_fd_not_found):
-    # We need to mock os.walk as well since fallback uses it
-    with mock.patch("os.walk") as mock_walk:
-        mock_walk.return_value = [
-            ("/root/repo3", [".git", "src"], ["README.md"]),
-            ("/root/repo4", ["src"], ["README.md"]),
-        ]
-        repos = convert.find_git_repos(Path("/root"))
-        # Should find repo3, but not repo4
-        assert len(repos) == 1
-        assert Path("/root/repo3") in repos
+def test_run_fd_streaming_splits_on_nul():
+    # Chunk boundaries fall in the middle of entries; one path contains a newline
+    # Duplicate and trailing-separator entries collapse to one repo each
+    chunks = [b"/path/to/repo1/.git\0/path/to/re", b"po2/.git\0/path/to/new\nline/.git", b"\0/path/to/repo1/.git/\0", b""]
+    with mock.patch("subprocess.Popen") as mock_popen:
+        proc = mock_popen.return_value.__enter__.return_value
+        proc.stdout.read1.side_effect = chunks
+        proc.returncode = 0
+
+        code, repos, err = convert._run_fd_streaming(["fd"])
+        assert code == 0
+        assert sorted(repos) == sorted([Path("/path/to/repo1"), Path("/path/to/repo2"), Path("/path/to/new\nline")])
+        assert err == ""
+
+def test_run_fd_streaming_not_found():
+    code, repos, err = convert._run_fd_streaming(["definitely-not-a-real-fd-binary"])
+    assert code == 127
+    assert repos == []
 
 def test_run_command_mock():
     with mock.patch("subprocess.run") as mock_run:
@@ -71,6 +114,34 @@ def test_run_command_mock():
         assert code == 0
         assert out == "output"
 
+def test_process_repo_statuses():
+    def git_side_effect(cmd, cwd=None, capture=True, env=None):
+        assert cmd[:2] == ["git", "-C"]
+        repo = Path(cmd[2])
+        if "get-url" in cmd:
+            return (0, f"https://github.com/user/{repo.name}.git\n", "")
+        if "fetch" in cmd and repo.name == "broken":
+            return (128, "", "fatal: repository not found")
+        return (0, "", "")
+
+    with mock.patch("convert.run_command", side_effect=git_side_effect):
+        status, messages = convert.process_repo(Path("/repo/a"), "github.com", "gitlab.com")
+        assert status == "success"
+        assert "  New Origin:     https://gitlab.com/user/a.git" in messages
+
+        status, _ = convert.process_repo(Path("/repo/a"), "bitbucket.org", "gitlab.com")
+        assert status == "skipped"
+
+        status, _ = convert.process_repo(Path("/repo/broken"), "github.com", "gitlab.com")
+        assert status == "failed"
+
+def test_process_repo_uses_git_env():
+    with mock.patch("convert.run_command", return_value=(0, "https://github.com/user/repo.git", "")) as mock_run:
+        convert.process_repo(Path("/repo/a"), "github.com", "gitlab.com")
+        for call in mock_run.call_args_list:
+            assert call.kwargs["env"]["GIT_TERMINAL_PROMPT"] == "0"
+            assert call.kwargs["env"]["GIT_OPTIONAL_LOCKS"] == "0"
+
 def test_main_batch_flow(tmp_path):
     # Test the main CLI flow in batch mode with mocked finding and git operations
     with mock.patch("convert.find_git_repos") as mock_find, \
@@ -86,7 +157,7 @@ def test_main_batch_flow(tmp_path):
         # 3. git fetch origin
 
         # We can use side_effect to return different values based on command
-        def git_side_effect(cmd, cwd=None, capture=True):
+        def git_side_effect(cmd, cwd=None, capture=True, env=None):
             cmd_str = " ".join(cmd)
             if "get-url" in cmd_str:
                 return (0, "https://github.com/user/repo.git", "")
@@ -109,6 +180,87 @@ def test_main_batch_flow(tmp_path):
         assert "Found 2 repositories" in result.stdout
         assert "New Origin:     https://gitlab.com/user/repo.git" in result.stdout
         assert "Success: 2" in result.stdout
+        # Batch mode reports progress with a plain counter
+        assert "[2/2]" in result.stdout
+
+def test_main_interrupt_cancels_queued_repos(tmp_path):
+    repos = [Path(f"/repo/r{i}") for i in range(10)]
+
+    def interrupt_after_first(futures):
+        # Deliver one result, then simulate Ctrl-C in the main thread
+        yield next(as_completed(futures))
+        raise KeyboardInterrupt
+
+    def slow_process(repo, find, replace):
+        time.sleep(0.05)
+        return ("success", [f"repo: {repo}"])
+
+    with mock.patch("convert.find_git_repos", return_value=repos), \
+         mock.patch("convert.process_repo", side_effect=slow_process) as mock_process, \
+         mock.patch("convert.as_completed", side_effect=interrupt_after_first), \
+         mock.patch("convert.MAX_WORKERS", 1):
+
+        result = runner.invoke(convert.app, [
+            str(tmp_path),
+            "--find", "github.com",
+            "--replace", "gitlab.com",
+            "--batch"
+        ])
+
+        assert result.exit_code == 1
+        assert "Interrupted." in result.stdout
+        # Only the repo that completed and the one already running were processed
+        assert mock_process.call_count <= 2
+        assert f"Processed {mock_process.call_count} of 10 repositories" in result.stdout
+
+def test_main_sorts_repos(tmp_path):
+    with mock.patch("convert.find_git_repos") as mock_find, \
+         mock.patch("convert.process_repo") as mock_process, \
+         mock.patch("convert.track", side_effect=lambda x, **kwargs: x):
+
+        mock_find.return_value = [Path("/repo/b"), Path("/repo/a")]
+        mock_process.side_effect = lambda repo, find, replace: ("skipped", [f"repo: {repo}"])
+
+        result = runner.invoke(convert.app, [
+            str(tmp_path),
+            "--find", "github.com",
+            "--replace", "gitlab.com",
+            "--batch"
+        ])
+
+        assert result.exit_code == 0
+        assert "Found 2 repositories" in result.stdout
+        processed = sorted(call.args[0] for call in mock_process.call_args_list)
+        assert processed == [Path("/repo/a"), Path("/repo/b")]
+
+@pytest.mark.parametrize("flag, expected_count", [([], 2), (["--resolve-symlinks"], 1)])
+def test_main_resolve_symlinks(tmp_path, flag, expected_count):
+    # Two symlinks to one repo only collapse when --resolve-symlinks is given
+    repo = tmp_path / "real" / "repo"
+    (repo / ".git").mkdir(parents=True)
+    (tmp_path / "link1").symlink_to(repo, target_is_directory=True)
+    (tmp_path / "link2").symlink_to(repo, target_is_directory=True)
+
+    with mock.patch("convert.find_git_repos", return_value=[tmp_path / "link1", tmp_path / "link2"]), \
+         mock.patch("convert.process_repo") as mock_process:
+
+        mock_process.return_value = ("skipped", [])
+
+        result = runner.invoke(convert.app, [
+            str(tmp_path),
+            "--find", "github.com",
+            "--replace", "gitlab.com",
+            "--batch",
+            *flag
+        ])
+
+        assert result.exit_code == 0
+        assert f"Found {expected_count} repositories" in result.stdout
+        processed = sorted(call.args[0] for call in mock_process.call_args_list)
+        if flag:
+            assert processed == [repo.resolve()]
+        else:
+            assert processed == [tmp_path / "link1", tmp_path / "link2"]
 
 def test_main_interactive_exclude(tmp_path):
     # Test interactive exclusion (mocking questionary)
@@ -124,7 +276,7 @@ def test_main_interactive_exclude(tmp_path):
         mock_checkbox.return_value.ask.return_value = ["/repo/a"]
         mock_confirm.return_value.ask.return_value = True
 
-        def git_side_effect(cmd, cwd=None, capture=True):
+        def git_side_effect(cmd, cwd=None, capture=True, env=None):
             cmd_str = " ".join(cmd)
             if "get-url" in cmd_str:
                 return (0, "https://github.com/user/repo.git", "")
@@ -143,3 +295,80 @@ def test_main_interactive_exclude(tmp_path):
         assert "repo: /repo/a" in result.stdout
         # Should NOT process repo b
         assert "repo: /repo/b" not in result.stdout
+
+def test_filter_excluded():
+    repos = [Path("/work/app"), Path("/work/vendor/lib"), Path("/work/tools")]
+    assert convert.filter_excluded(repos, "") == repos
+    assert convert.filter_excluded(repos, "*/vendor/*") == [Path("/work/app"), Path("/work/tools")]
+    assert convert.filter_excluded(repos, " */vendor/* , */tools ") == [Path("/work/app")]
+
+def test_main_many_repos_prompts_for_excludes(tmp_path):
+    # Above CHECKBOX_MAX_REPOS the checkbox is skipped in favour of an exclude prompt
+    repos = [Path(f"/repo/r{i}") for i in range(convert.CHECKBOX_MAX_REPOS + 1)]
+    with mock.patch("convert.find_git_repos", return_value=repos), \
+         mock.patch("convert.process_repo") as mock_process, \
+         mock.patch("convert.track", side_effect=lambda x, **kwargs: x), \
+         mock.patch("questionary.checkbox") as mock_checkbox, \
+         mock.patch("questionary.text") as mock_text, \
+         mock.patch("questionary.confirm") as mock_confirm:
+
+        mock_text.return_value.ask.return_value = "/repo/r1*"
+        mock_confirm.return_value.ask.return_value = True
+        mock_process.return_value = ("skipped", [])
+
+        result = runner.invoke(convert.app, [
+            str(tmp_path),
+            "--find", "github.com",
+            "--replace", "gitlab.com"
+        ])
+
+        assert result.exit_code == 0
+        mock_checkbox.assert_not_called()
+        processed = {call.args[0] for call in mock_process.call_args_list}
+        assert Path("/repo/r0") in processed
+        assert not any(str(r).startswith("/repo/r1") for r in processed)
+
+def test_main_batch_exclude(tmp_path):
+    with mock.patch("convert.find_git_repos", return_value=[Path("/repo/a"), Path("/repo/b")]), \
+         mock.patch("convert.process_repo") as mock_process:
+
+        mock_process.return_value = ("skipped", [])
+
+        result = runner.invoke(convert.app, [
+            str(tmp_path),
+            "--find", "github.com",
+            "--replace", "gitlab.com",
+            "--batch",
+            "--exclude", "*/b"
+        ])
+
+        assert result.exit_code == 0
+        processed = [call.args[0] for call in mock_process.call_args_list]
+        assert processed == [Path("/repo/a")]
+
+def test_main_many_repos_with_exclude_skips_prompts(tmp_path):
+    # --exclude given up front: no checkbox and no exclude prompt, even above CHECKBOX_MAX_REPOS
+    repos = [Path(f"/repo/r{i}") for i in range(convert.CHECKBOX_MAX_REPOS + 1)]
+    with mock.patch("convert.find_git_repos", return_value=repos), \
+         mock.patch("convert.process_repo") as mock_process, \
+         mock.patch("convert.track", side_effect=lambda x, **kwargs: x), \
+         mock.patch("questionary.checkbox") as mock_checkbox, \
+         mock.patch("questionary.text") as mock_text, \
+         mock.patch("questionary.confirm") as mock_confirm:
+
+        mock_confirm.return_value.ask.return_value = True
+        mock_process.return_value = ("skipped", [])
+
+        result = runner.invoke(convert.app, [
+            str(tmp_path),
+            "--find", "github.com",
+            "--replace", "gitlab.com",
+            "--exclude", "/repo/r1*"
+        ])
+
+        assert result.exit_code == 0
+        mock_checkbox.assert_not_called()
+        mock_text.assert_not_called()
+        processed = {call.args[0] for call in mock_process.call_args_list}
+        assert Path("/repo/r0") in processed
+        assert not any(str(r).startswith("/repo/r1") for r in processed)